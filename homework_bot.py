@@ -1,15 +1,28 @@
 import logging
 import os
+import random
+import signal
 import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
 from json.decoder import JSONDecodeError
+from pathlib import Path
+from types import MappingProxyType
 from typing import Any
 
+import orjson
 import requests
 import telegram
 from dotenv import load_dotenv
-from telegram.error import TelegramError
+from requests.adapters import HTTPAdapter
+from telegram.error import (
+    BadRequest, NetworkError, RetryAfter, TelegramError, TimedOut
+)
+from telegram.utils.request import Request
+from urllib3.util import Retry
 
 import user_exceptions
 
@@ -21,15 +34,47 @@ TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
 RETRY_TIME = 600
+MIN_RETRY_TIME = 30
+SEND_WORKERS = 8
+SEND_ATTEMPTS = 5
+BACKOFF_TIME = 1
+MAX_BACKOFF_TIME = 60
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f"OAuth {PRACTICUM_TOKEN}"}
+REQUEST_TIMEOUT = (5, 10)
+STATE_FILE = Path(
+    os.getenv('STATE_FILE') or Path(__file__).resolve().parent / '.state'
+)
+SEEN_STATUSES_SIZE = 1024
 
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=1.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False
+    )
+))
 
-HOMEWORK_STATUSES = {
+# Валидаторы и тело последнего ответа API для условных запросов.
+_cache = {
+    'from_date': None,
+    'etag': None,
+    'last_modified': None,
+    'body': None,
+}
+
+
+HOMEWORK_STATUSES = MappingProxyType({
     'approved': "Работа проверена: ревьюеру всё понравилось. Ура!",
     'reviewing': "Работа взята на проверку ревьюером.",
     'rejected': "Работа проверена: у ревьюера есть замечания."
-}
+})
+STATUS_MESSAGE_TEMPLATE = 'Изменился статус проверки работы "{}". {}'
 
 
 hw_logger = logging.getLogger(__name__)
@@ -38,6 +83,7 @@ handler = logging.StreamHandler(sys.stdout)
 hw_logger.addHandler(handler)
 formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
 handler.setFormatter(formatter)
+logging.getLogger('urllib3.connectionpool').addHandler(handler)
 
 
 def check_tokens() -> bool:
@@ -45,21 +91,51 @@ def check_tokens() -> bool:
     Проверка доступности переменных окружения.
     При успешной проверке возвращает True, в противном случае - False.
     """
-    required_vars = ['PRACTICUM_TOKEN', 'TELEGRAM_TOKEN', 'TELEGRAM_CHAT_ID']
-    missing_vars = []
-    for var in required_vars:
-        if globals()[var] is None or globals()[var] == '':
-            missing_vars.append(var)
+    required_vars = (
+        ('PRACTICUM_TOKEN', PRACTICUM_TOKEN),
+        ('TELEGRAM_TOKEN', TELEGRAM_TOKEN),
+        ('TELEGRAM_CHAT_ID', TELEGRAM_CHAT_ID),
+    )
+    missing_vars = [name for name, value in required_vars if not value]
     if missing_vars:
         hw_logger.critical(
-            f"Отсутствуют необходимые переменные окружения: "
-            f"{','.join(missing_vars)}.\n"
-            f"Программа принудительно остановлена."
+            "Отсутствуют необходимые переменные окружения: %s.\n"
+            "Программа принудительно остановлена.",
+            ','.join(missing_vars)
         )
         return False
     return True
 
 
+def _conditional_headers(timestamp: int) -> dict:
+    """
+    Возвращает заголовки запроса к API, дополненные валидаторами
+    сохранённого ответа для той же временной метки.
+    """
+    headers = dict(HEADERS)
+    if _cache['from_date'] == timestamp:
+        if _cache['etag'] is not None:
+            headers['If-None-Match'] = _cache['etag']
+        if _cache['last_modified'] is not None:
+            headers['If-Modified-Since'] = _cache['last_modified']
+    return headers
+
+
+def _store_validators(
+    timestamp: int, response: requests.Response, body: Any
+) -> None:
+    """Сохраняет ответ API, если сервер прислал ETag или Last-Modified."""
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag is not None or last_modified is not None:
+        _cache.update(
+            from_date=timestamp,
+            etag=etag,
+            last_modified=last_modified,
+            body=body
+        )
+
+
 def get_api_answer(current_timestamp: int) -> Any:
     """
     Делает запрос к эндпоинту API сервиса Практикум.Домашка и
@@ -68,7 +144,12 @@ def get_api_answer(current_timestamp: int) -> Any:
     timestamp = current_timestamp or int(time.time())
     params = {'from_date': timestamp}
     try:
-        response = requests.get(ENDPOINT, headers=HEADERS, params=params)
+        response = SESSION.get(
+            ENDPOINT,
+            headers=_conditional_headers(timestamp),
+            params=params,
+            timeout=REQUEST_TIMEOUT
+        )
     except requests.exceptions.ConnectionError:
         raise requests.exceptions.ConnectionError(
             "Ошибка соединения с сервером API."
@@ -85,13 +166,19 @@ def get_api_answer(current_timestamp: int) -> Any:
         raise requests.exceptions.RequestException(
             "Отказ в обслуживании запроса к API. "
         )
+    if (response.status_code == HTTPStatus.NOT_MODIFIED
+            and _cache['from_date'] == timestamp):
+        return _cache['body']
     if response.status_code != HTTPStatus.OK:
         raise user_exceptions.EndPointError
     try:
-        response = response.json()
-    except JSONDecodeError:
-        raise JSONDecodeError("Ошибка декодирования ответа API.")
-    return response
+        body = orjson.loads(response.content)
+    except (JSONDecodeError, orjson.JSONDecodeError) as error:
+        raise JSONDecodeError(
+            "Ошибка декодирования ответа API.", error.doc, error.pos
+        )
+    _store_validators(timestamp, response, body)
+    return body
 
 
 def check_response(response: Any) -> list:
@@ -99,14 +186,14 @@ def check_response(response: Any) -> list:
     Проверка ответа API на соотвествие ожидаемой структуре данных.
     При успешной проверке возвращает список домашних работ (может быть пустым).
     """
-    if not isinstance(response, dict):
+    if type(response) is not dict:
         raise TypeError("Ответ API не в виде словаря.")
     elif not response:
         raise user_exceptions.EmptyResponseDictError
     homeworks = response.get('homeworks')
     if homeworks is None:
         raise KeyError("В ответе API отсутствует ключ 'homeworks'")
-    elif not isinstance(homeworks, list):
+    elif type(homeworks) is not list:
         raise TypeError("Значение ключа 'homeworks' должно быть списком.'")
     return homeworks
 
@@ -122,64 +209,253 @@ def parse_status(homework: dict) -> str:
         raise KeyError("В словаре 'homework' нет ключа 'homework_name'.")
     elif homework_status is None:
         raise KeyError("В словаре 'homework' нет ключа 'status'.")
-    verdict = HOMEWORK_STATUSES.get(homework_status)
-    if verdict is None:
+    try:
+        verdict = HOMEWORK_STATUSES[homework_status]
+    except KeyError:
         raise user_exceptions.UnknownHomeworkStatusError
-    return (f"Изменился статус проверки работы"
-            f' "{homework_name}". {verdict}')
+    return STATUS_MESSAGE_TEMPLATE.format(homework_name, verdict)
 
 
 def send_message(bot: telegram.Bot, message: str) -> None:
     """
     Отправляет пользователю сообщение о статусе проверки домашней работы
     с помощью Telegram-бота.
+    При временных сбоях Telegram повторяет отправку с экспоненциально
+    растущей паузой, но не более SEND_ATTEMPTS раз.
+    TimedOut не повторяется: сообщение могло быть доставлено,
+    и повтор продублировал бы его в чате.
+    """
+    for attempt in range(1, SEND_ATTEMPTS + 1):
+        try:
+            bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message)
+            return
+        except BadRequest:
+            raise BadRequest("Ошибка отправки сообщения в Telegram.")
+        except RetryAfter as error:
+            delay = error.retry_after
+        except TimedOut:
+            raise TelegramError("Истекло время ожидания ответа Telegram.")
+        except NetworkError:
+            delay = min(
+                MAX_BACKOFF_TIME, BACKOFF_TIME * 2 ** (attempt - 1)
+            ) + random.uniform(0, BACKOFF_TIME)
+        except TelegramError:
+            raise TelegramError("Ошибка отправки сообщения в Telegram.")
+        if attempt == SEND_ATTEMPTS:
+            raise TelegramError("Ошибка отправки сообщения в Telegram.")
+        hw_logger.warning(
+            "Повтор отправки сообщения в Telegram через %.1f с "
+            "(попытка %s из %s).",
+            delay, attempt, SEND_ATTEMPTS
+        )
+        time.sleep(delay)
+
+
+def _is_status_key(key: Any) -> bool:
+    """Проверяет, что сохранённый ключ обновления статуса корректен."""
+    return (
+        type(key) is list
+        and len(key) == 3
+        and all(item is None or type(item) is str for item in key)
+    )
+
+
+def load_state() -> dict:
+    """
+    Читает состояние бота, сохранённое при предыдущем запуске.
+    Если файла состояния нет или он повреждён, возвращает пустой словарь;
+    некорректные значения в нём отбрасываются.
     """
     try:
-        bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message)
-    except TelegramError:
-        raise TelegramError("Ошибка отправки сообщения в Telegram.")
+        state = orjson.loads(STATE_FILE.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+    if type(state) is not dict:
+        return {}
+    current_timestamp = state.get('current_timestamp')
+    if type(current_timestamp) is not int or current_timestamp <= 0:
+        state.pop('current_timestamp', None)
+    seen_statuses = state.pop('seen_statuses', None)
+    if type(seen_statuses) is list:
+        state['seen_statuses'] = OrderedDict(
+            (tuple(key), None) for key in seen_statuses if _is_status_key(key)
+        )
+    return state
+
+
+def save_state(state: dict) -> None:
+    """
+    Атомарно сохраняет состояние бота в файл STATE_FILE:
+    данные пишутся во временный файл, который затем заменяет основной.
+    """
+    temp_file = STATE_FILE.with_name(STATE_FILE.name + '.tmp')
+    temp_file.write_bytes(orjson.dumps(state))
+    os.replace(temp_file, STATE_FILE)
+
+
+def status_key(homework: dict) -> tuple:
+    """
+    Возвращает ключ обновления статуса домашней работы:
+    название работы, статус и время обновления.
+    """
+    return (
+        homework.get('homework_name'),
+        homework.get('status'),
+        homework.get('date_updated'),
+    )
+
+
+def select_new_homeworks(homeworks: list, seen: OrderedDict) -> list:
+    """
+    Отбирает домашние работы, об обновлении статуса которых
+    бот ещё не сообщал; повторы внутри одного ответа API отбрасываются.
+    """
+    new_homeworks = []
+    batch_keys = set()
+    for homework in homeworks:
+        key = status_key(homework)
+        if key in seen:
+            seen.move_to_end(key)
+        elif key not in batch_keys:
+            batch_keys.add(key)
+            new_homeworks.append(homework)
+    return new_homeworks
+
+
+def remember_homeworks(homeworks: list, seen: OrderedDict) -> None:
+    """
+    Запоминает отправленные обновления статусов, храня не более
+    SEEN_STATUSES_SIZE последних из них.
+    """
+    for homework in homeworks:
+        seen[status_key(homework)] = None
+        if len(seen) > SEEN_STATUSES_SIZE:
+            seen.popitem(last=False)
+
+
+def is_handled(homeworks: list, seen: OrderedDict) -> bool:
+    """
+    Проверяет, что все обновления статусов из ответа API отправлены
+    или окончательно пропущены, и временную метку запроса можно сдвинуть.
+    """
+    return all(status_key(homework) in seen for homework in homeworks)
+
+
+def send_messages(
+    bot: telegram.Bot,
+    executor: ThreadPoolExecutor,
+    homeworks: list,
+    seen: OrderedDict
+) -> None:
+    """
+    Параллельно отправляет пользователю сообщения о статусах домашних работ
+    одного цикла проверки с помощью пула потоков. Каждую успешную отправку
+    логирует и запоминает в seen. Работы, статус которых не удалось
+    разобрать или сообщение о которых Telegram отверг (BadRequest),
+    пропускаются и тоже запоминаются, чтобы не мешать остальным.
+    Дожидается всех отправок, после чего выбрасывает первую из ошибок.
+    """
+    errors = []
+    sendings = []
+    for homework in homeworks:
+        try:
+            message = parse_status(homework)
+        except (KeyError, user_exceptions.UnknownHomeworkStatusError) as error:
+            hw_logger.error("Домашняя работа пропущена: %s", error)
+            remember_homeworks([homework], seen)
+            errors.append(error)
+        else:
+            sending = executor.submit(send_message, bot, message)
+            sendings.append((homework, message, sending))
+    for homework, message, sending in sendings:
+        error = sending.exception()
+        if error is None:
+            remember_homeworks([homework], seen)
+            hw_logger.info("Бот отправил сообщение:\n%s", message)
+        else:
+            if isinstance(error, BadRequest):
+                remember_homeworks([homework], seen)
+            errors.append(error)
+    if errors:
+        raise errors[0]
+
+
+def report_error(
+    bot: telegram.Bot, error: Exception, previous_error: Any
+) -> tuple:
+    """
+    Логирует сбой в работе программы и сообщает о нём в Telegram,
+    если он отличается от предыдущего. Возвращает сигнатуру сбоя
+    (имя класса и текст ошибки) для сравнения со следующим.
+    """
+    hw_logger.error("%s", error)
+    current_error = (type(error).__name__, str(error))
+    if previous_error != current_error and not isinstance(
+        error, TelegramError
+    ):
+        try:
+            send_message(bot, f"Сбой в работе программы: {error}")
+        except TelegramError as t_error:
+            hw_logger.error("%s", t_error)
+    return current_error
 
 
 def main() -> None:
     """Логика работы телеграм-бота."""
     if not check_tokens():
         raise user_exceptions.MissingVariableError
-    bot = telegram.Bot(token=TELEGRAM_TOKEN)
+    connect_timeout, read_timeout = REQUEST_TIMEOUT
+    request = Request(
+        con_pool_size=SEND_WORKERS,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout
+    )
+    bot = telegram.Bot(token=TELEGRAM_TOKEN, request=request)
+    executor = ThreadPoolExecutor(max_workers=SEND_WORKERS)
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop_event.set())
     hw_logger.info("Бот запущен.")
-    current_timestamp = int(time.time())
-    previous_error = ''
-    while True:
+    state = load_state()
+    current_timestamp = state.get('current_timestamp') or int(time.time())
+    seen_statuses = state.get('seen_statuses', OrderedDict())
+    previous_error = None
+    retry_time = MIN_RETRY_TIME
+    while not stop_event.is_set():
         try:
             response = get_api_answer(current_timestamp)
             homeworks = check_response(response)
             if homeworks:
-                for homework in homeworks:
-                    message = parse_status(homework)
-                    send_message(bot, message)
-                    hw_logger.info(
-                        f"Бот отправил сообщение:\n"
-                        f"{message}"
-                    )
+                homeworks = select_new_homeworks(homeworks, seen_statuses)
+                try:
+                    send_messages(bot, executor, homeworks, seen_statuses)
+                finally:
+                    if is_handled(homeworks, seen_statuses):
+                        current_timestamp = response.get(
+                            'current_date', int(time.time())
+                        )
+                        save_state({
+                            'current_timestamp': current_timestamp,
+                            'seen_statuses': list(seen_statuses),
+                        })
+                retry_time = MIN_RETRY_TIME
             else:
                 hw_logger.debug("Нет обновлений статуса домашних работ.")
+                retry_time = min(RETRY_TIME, retry_time * 2)
         except Exception as error:
-            message = f"Сбой в работе программы: {error}"
-            hw_logger.error(error)
-            if previous_error != error and not isinstance(
-                error, TelegramError
-            ):
-                try:
-                    send_message(bot, message)
-                except TelegramError as t_error:
-                    hw_logger.error(t_error)
-            previous_error = error
+            previous_error = report_error(bot, error, previous_error)
+            retry_time = RETRY_TIME
         else:
+            previous_error = None
             hw_logger.info(
                 "Проверка статуса домашних работ успешно завершена."
             )
         finally:
-            current_timestamp = int(time.time())
-            time.sleep(RETRY_TIME)
+            stop_event.wait(retry_time)
+    executor.shutdown()
+    SESSION.close()
+    request.stop()
+    hw_logger.info("Бот остановлен.")
 
 
 if __name__ == '__main__':
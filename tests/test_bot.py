@@ -1,7 +1,9 @@
+import json
 import os
 from http import HTTPStatus
+from pathlib import Path
+from types import SimpleNamespace
 
-import requests
 import telegram
 import utils
 
@@ -44,6 +46,11 @@ class MockResponseGET:
         )
         self.random_timestamp = random_timestamp
         self.status_code = http_status
+        self.headers = {}
+
+    @property
+    def content(self):
+        return json.dumps(self.json()).encode()
 
     def json(self):
         data = {
@@ -73,6 +80,57 @@ class MockTelegramBot:
         return self.random_timestamp
 
 
+def run_main(monkeypatch, tmp_path, answers):
+    """
+    Runs main() for one cycle per item of answers: a dict is returned as the
+    API response, an exception is raised by get_api_answer.
+    Returns sent messages, stop event wait timeouts and requested timestamps.
+    """
+    import homework_bot
+
+    sent = []
+    timeouts = []
+    from_dates = []
+
+    class MockStopEvent:
+
+        def is_set(self):
+            return len(timeouts) >= len(answers)
+
+        def set(self):
+            pass
+
+        def wait(self, timeout=None):
+            timeouts.append(timeout)
+
+    class MockRecordingTelegramBot(MockTelegramBot):
+
+        def send_message(self, chat_id=None, text=None, **kwargs):
+            sent.append(text)
+            return super().send_message(chat_id, text, **kwargs)
+
+    def mock_get_api_answer(current_timestamp):
+        from_dates.append(current_timestamp)
+        answer = answers[len(from_dates) - 1]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(telegram, 'Bot', MockRecordingTelegramBot)
+    monkeypatch.setattr(homework_bot, 'get_api_answer', mock_get_api_answer)
+    monkeypatch.setattr(
+        homework_bot, 'threading', SimpleNamespace(Event=MockStopEvent)
+    )
+    monkeypatch.setattr(homework_bot.signal, 'signal', lambda *args: None)
+    monkeypatch.setattr(homework_bot, 'STATE_FILE', tmp_path / '.state')
+    monkeypatch.setattr(homework_bot, 'PRACTICUM_TOKEN', 'sometoken')
+    monkeypatch.setattr(homework_bot, 'TELEGRAM_TOKEN', '1234:abcdefg')
+    monkeypatch.setattr(homework_bot, 'TELEGRAM_CHAT_ID', 12345)
+
+    homework_bot.main()
+    return sent, timeouts, from_dates
+
+
 class TestHomework:
     HOMEWORK_STATUSES = {
         'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
@@ -150,6 +208,39 @@ class TestHomework:
             f'функция {func_name} возвращает True'
         )
 
+    def test_user_exceptions(self):
+        import copy
+        import pickle
+
+        import user_exceptions
+
+        error = user_exceptions.MissingVariableError
+        assert str(error()) == error.MESSAGE, (
+            'Убедитесь, что `MissingVariableError` без аргументов '
+            'выводит только сообщение об ошибке'
+        )
+        assert str(error(['A'])) == f'{error.MESSAGE} A', (
+            'Убедитесь, что `MissingVariableError` выводит имена '
+            'отсутствующих переменных'
+        )
+        for exception in (
+            error(['A', 'B']),
+            user_exceptions.EndPointError(),
+            user_exceptions.EmptyResponseDictError(),
+            user_exceptions.UnknownHomeworkStatusError(),
+        ):
+            for restored in (
+                pickle.loads(pickle.dumps(exception)), copy.copy(exception)
+            ):
+                assert restored.args == exception.args, (
+                    f'Убедитесь, что `{type(exception).__name__}` '
+                    'корректно восстанавливается при копировании'
+                )
+                assert str(restored) == str(exception), (
+                    f'Убедитесь, что `{type(exception).__name__}` '
+                    'корректно восстанавливается при копировании'
+                )
+
     def test_bot_init_not_global(self):
         import homework_bot
 
@@ -178,6 +269,284 @@ class TestHomework:
         import homework_bot
         utils.check_function(homework_bot, 'send_message', 2)
 
+    def test_send_message_retry_after(self, monkeypatch, random_timestamp):
+        attempts = []
+
+        class MockFloodedTelegramBot(MockTelegramBot):
+
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                attempts.append(text)
+                if len(attempts) == 1:
+                    raise telegram.error.RetryAfter(1)
+                return super().send_message(chat_id, text, **kwargs)
+
+        import homework_bot
+
+        monkeypatch.setattr(homework_bot.time, 'sleep', lambda delay: None)
+        monkeypatch.setattr(homework_bot, 'TELEGRAM_CHAT_ID', 12345)
+
+        bot = MockFloodedTelegramBot(
+            token='1234:abcdefg', random_timestamp=random_timestamp
+        )
+        homework_bot.send_message(bot, 'test')
+        assert len(attempts) == 2, (
+            'Убедитесь, что функция `send_message` повторяет отправку '
+            'сообщения после ошибки `RetryAfter`'
+        )
+
+    def test_send_message_backoff(self, monkeypatch, random_timestamp):
+        attempts = []
+        delays = []
+
+        class MockOfflineTelegramBot(MockTelegramBot):
+
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                attempts.append(text)
+                raise telegram.error.NetworkError('Connection reset')
+
+        import homework_bot
+
+        monkeypatch.setattr(homework_bot.time, 'sleep', delays.append)
+        monkeypatch.setattr(homework_bot.random, 'uniform', lambda a, b: 0)
+        monkeypatch.setattr(homework_bot, 'MAX_BACKOFF_TIME', 4)
+        monkeypatch.setattr(homework_bot, 'TELEGRAM_CHAT_ID', 12345)
+
+        bot = MockOfflineTelegramBot(
+            token='1234:abcdefg', random_timestamp=random_timestamp
+        )
+        try:
+            homework_bot.send_message(bot, 'test')
+        except telegram.error.TelegramError:
+            pass
+        else:
+            assert False, (
+                'Убедитесь, что функция `send_message` выбрасывает ошибку, '
+                'когда попытки отправки исчерпаны'
+            )
+        assert len(attempts) == homework_bot.SEND_ATTEMPTS, (
+            'Убедитесь, что функция `send_message` делает не более '
+            '`SEND_ATTEMPTS` попыток отправки'
+        )
+        assert delays == [1, 2, 4, 4], (
+            'Убедитесь, что пауза между попытками отправки растёт '
+            'экспоненциально и не превышает `MAX_BACKOFF_TIME`'
+        )
+
+    def test_send_message_timed_out(self, monkeypatch, random_timestamp):
+        attempts = []
+
+        class MockSlowTelegramBot(MockTelegramBot):
+
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                attempts.append(text)
+                raise telegram.error.TimedOut()
+
+        import homework_bot
+
+        monkeypatch.setattr(homework_bot.time, 'sleep', lambda delay: None)
+        monkeypatch.setattr(homework_bot, 'TELEGRAM_CHAT_ID', 12345)
+
+        bot = MockSlowTelegramBot(
+            token='1234:abcdefg', random_timestamp=random_timestamp
+        )
+        try:
+            homework_bot.send_message(bot, 'test')
+        except telegram.error.TelegramError:
+            pass
+        assert len(attempts) == 1, (
+            'Убедитесь, что функция `send_message` не повторяет отправку '
+            'после `TimedOut`: сообщение могло быть доставлено'
+        )
+
+    def test_send_messages_logs_all_sent(self, monkeypatch, caplog,
+                                         random_timestamp):
+        from collections import OrderedDict
+        from concurrent.futures import ThreadPoolExecutor
+
+        class MockFailingTelegramBot(MockTelegramBot):
+
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                if '"first"' in text:
+                    raise telegram.error.Unauthorized('Unauthorized')
+                return super().send_message(chat_id, text, **kwargs)
+
+        import homework_bot
+
+        monkeypatch.setattr(homework_bot, 'TELEGRAM_CHAT_ID', 12345)
+
+        bot = MockFailingTelegramBot(
+            token='1234:abcdefg', random_timestamp=random_timestamp
+        )
+        homeworks = [
+            {'homework_name': 'first', 'status': 'approved'},
+            {'homework_name': 'second', 'status': 'approved'},
+        ]
+        seen = OrderedDict()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            try:
+                homework_bot.send_messages(bot, executor, homeworks, seen)
+            except telegram.error.TelegramError:
+                pass
+            else:
+                assert False, (
+                    'Убедитесь, что функция `send_messages` выбрасывает '
+                    'ошибку, если одно из сообщений не отправлено'
+                )
+        assert '"second"' in caplog.text, (
+            'Убедитесь, что функция `send_messages` логирует успешные '
+            'отправки, даже если другое сообщение не отправлено'
+        )
+        assert list(seen) == [homework_bot.status_key(homeworks[1])], (
+            'Убедитесь, что функция `send_messages` запоминает только '
+            'успешно отправленные обновления статусов'
+        )
+
+    def test_send_messages_bad_request(self, monkeypatch, random_timestamp):
+        from collections import OrderedDict
+        from concurrent.futures import ThreadPoolExecutor
+
+        class MockRejectingTelegramBot(MockTelegramBot):
+
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                raise telegram.error.BadRequest('Message is too long')
+
+        import homework_bot
+
+        monkeypatch.setattr(homework_bot, 'TELEGRAM_CHAT_ID', 12345)
+
+        bot = MockRejectingTelegramBot(
+            token='1234:abcdefg', random_timestamp=random_timestamp
+        )
+        homeworks = [{'homework_name': 'hw123', 'status': 'approved'}]
+        seen = OrderedDict()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            try:
+                homework_bot.send_messages(bot, executor, homeworks, seen)
+            except telegram.error.BadRequest:
+                pass
+            else:
+                assert False, (
+                    'Убедитесь, что функция `send_messages` выбрасывает '
+                    'ошибку `BadRequest`, если Telegram отверг сообщение'
+                )
+        assert homework_bot.is_handled(homeworks, seen), (
+            'Убедитесь, что сообщение, отвергнутое Telegram, запоминается '
+            'и не отправляется повторно'
+        )
+
+    def test_send_messages_skips_unparsed(self, monkeypatch,
+                                          random_timestamp):
+        from collections import OrderedDict
+        from concurrent.futures import ThreadPoolExecutor
+
+        sent = []
+
+        class MockRecordingTelegramBot(MockTelegramBot):
+
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                sent.append(text)
+                return super().send_message(chat_id, text, **kwargs)
+
+        import homework_bot
+
+        monkeypatch.setattr(homework_bot, 'TELEGRAM_CHAT_ID', 12345)
+
+        bot = MockRecordingTelegramBot(
+            token='1234:abcdefg', random_timestamp=random_timestamp
+        )
+        homeworks = [
+            {'homework_name': 'unknown', 'status': 'unknown'},
+            {'homework_name': 'hw123', 'status': 'approved'},
+        ]
+        seen = OrderedDict()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            try:
+                homework_bot.send_messages(bot, executor, homeworks, seen)
+            except homework_bot.user_exceptions.UnknownHomeworkStatusError:
+                pass
+            else:
+                assert False, (
+                    'Убедитесь, что функция `send_messages` выбрасывает '
+                    'ошибку, если статус домашней работы не разобран'
+                )
+        assert len(sent) == 1 and '"hw123"' in sent[0], (
+            'Убедитесь, что функция `send_messages` отправляет сообщения '
+            'о корректных работах, даже если статус другой не разобран'
+        )
+        assert len(seen) == 2, (
+            'Убедитесь, что функция `send_messages` запоминает работы '
+            'с неразобранным статусом, чтобы не обрабатывать их повторно'
+        )
+
+    def test_main_mixed_response(self, monkeypatch, tmp_path):
+        mixed = {
+            'homeworks': [
+                {'homework_name': 'good', 'status': 'approved'},
+                {'homework_name': 'bad', 'status': 'unknown'},
+            ],
+            'current_date': 2
+        }
+        empty = {'homeworks': [], 'current_date': 3}
+        sent, _, from_dates = run_main(
+            monkeypatch, tmp_path, [mixed, empty, empty]
+        )
+        assert len([text for text in sent if '"good"' in text]) == 1, (
+            'Убедитесь, что сообщение о корректной домашней работе '
+            'отправляется один раз, даже если в ответе есть работа '
+            'с недокументированным статусом'
+        )
+        assert from_dates[1:] == [2, 2], (
+            'Убедитесь, что после окончательного сбоя обработки домашней '
+            'работы временная метка запроса сдвигается на `current_date`'
+        )
+
+    def test_main_error_sent_once(self, monkeypatch, tmp_path):
+        import homework_bot
+
+        error = homework_bot.user_exceptions.EndPointError
+        sent, _, _ = run_main(monkeypatch, tmp_path, [error(), error()])
+        assert len(sent) == 1, (
+            'Убедитесь, что при повторении одной и той же ошибки '
+            'бот отправляет сообщение о ней в Telegram только один раз'
+        )
+
+        empty = {'homeworks': [], 'current_date': 1}
+        sent, _, _ = run_main(
+            monkeypatch, tmp_path, [error(), empty, error()]
+        )
+        assert len(sent) == 2, (
+            'Убедитесь, что бот снова сообщает об ошибке, если она '
+            'повторилась после успешной проверки'
+        )
+
+    def test_main_retry_time(self, monkeypatch, tmp_path):
+        import homework_bot
+
+        empty = {'homeworks': [], 'current_date': 1}
+        update = {
+            'homeworks': [{'homework_name': 'hw123', 'status': 'approved'}],
+            'current_date': 2
+        }
+        error = homework_bot.user_exceptions.EndPointError()
+        _, timeouts, _ = run_main(
+            monkeypatch, tmp_path, [empty] * 6 + [update, error]
+        )
+        min_time = homework_bot.MIN_RETRY_TIME
+        max_time = homework_bot.RETRY_TIME
+        assert timeouts[:6] == [
+            min(max_time, min_time * 2 ** cycle) for cycle in range(1, 7)
+        ], (
+            'Убедитесь, что интервал ожидания удваивается при каждом пустом '
+            'ответе API, но не превышает RETRY_TIME'
+        )
+        assert timeouts[6] == min_time, (
+            'Убедитесь, что после получения обновлений интервал ожидания '
+            'сбрасывается до MIN_RETRY_TIME'
+        )
+        assert timeouts[7] == max_time, (
+            'Убедитесь, что после сбоя интервал ожидания равен RETRY_TIME'
+        )
+
     def test_get_api_answers(self, monkeypatch, random_timestamp,
                              current_timestamp, api_url):
         def mock_response_get(*args, **kwargs):
@@ -186,10 +555,10 @@ class TestHomework:
                 current_timestamp=current_timestamp, **kwargs
             )
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_response_get)
+
         func_name = 'get_api_answer'
         utils.check_function(homework_bot, func_name, 1)
 
@@ -232,10 +601,10 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_500_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_500_response_get)
+
         func_name = 'get_api_answer'
         try:
             homework_bot.get_api_answer(current_timestamp)
@@ -247,6 +616,140 @@ class TestHomework:
                 'когда API возвращает код, отличный от 200'
             )
 
+    def test_get_304_api_answer(self, monkeypatch, random_timestamp,
+                                current_timestamp, api_url):
+        etag = '"homeworks-etag"'
+
+        def mock_conditional_response_get(*args, **kwargs):
+            if kwargs['headers'].get('If-None-Match') == etag:
+                http_status = HTTPStatus.NOT_MODIFIED
+            else:
+                http_status = HTTPStatus.OK
+            response = MockResponseGET(
+                *args, random_timestamp=random_timestamp,
+                current_timestamp=current_timestamp,
+                http_status=http_status, **kwargs
+            )
+            response.headers = {'ETag': etag}
+            return response
+
+        import homework_bot
+
+        monkeypatch.setattr(homework_bot, '_cache', {
+            'from_date': None,
+            'etag': None,
+            'last_modified': None,
+            'body': None,
+        })
+        monkeypatch.setattr(
+            homework_bot.SESSION, 'get', mock_conditional_response_get
+        )
+
+        func_name = 'get_api_answer'
+        first = homework_bot.get_api_answer(current_timestamp)
+        second = homework_bot.get_api_answer(current_timestamp)
+        assert second is first, (
+            f'Убедитесь, что функция `{func_name}` при ответе API '
+            '304 Not Modified возвращает сохранённый ранее ответ'
+        )
+
+    def test_state_persistence(self, monkeypatch, tmp_path, random_timestamp):
+        import homework_bot
+
+        if not os.getenv('STATE_FILE'):
+            assert homework_bot.STATE_FILE.parent == Path(
+                homework_bot.__file__
+            ).resolve().parent, (
+                'Убедитесь, что файл состояния по умолчанию лежит рядом '
+                'с модулем бота, а не в текущей рабочей папке'
+            )
+        state_file = tmp_path / '.state'
+        monkeypatch.setattr(homework_bot, 'STATE_FILE', state_file)
+
+        assert homework_bot.load_state() == {}, (
+            'Убедитесь, что функция `load_state` возвращает пустой словарь, '
+            'если файла состояния нет'
+        )
+        homework_bot.save_state({'current_timestamp': random_timestamp})
+        assert homework_bot.load_state() == {
+            'current_timestamp': random_timestamp
+        }, (
+            'Убедитесь, что функция `load_state` возвращает состояние, '
+            'сохранённое функцией `save_state`'
+        )
+        for timestamp in ('123', 1.5, -1):
+            state_file.write_bytes(
+                json.dumps({'current_timestamp': timestamp}).encode()
+            )
+            assert 'current_timestamp' not in homework_bot.load_state(), (
+                'Убедитесь, что функция `load_state` отбрасывает '
+                f'некорректную временную метку {timestamp!r}'
+            )
+        state_file.write_bytes(json.dumps({'seen_statuses': [5]}).encode())
+        assert not homework_bot.load_state().get('seen_statuses'), (
+            'Убедитесь, что функция `load_state` отбрасывает '
+            'некорректные сохранённые обновления статусов'
+        )
+        state_file.write_bytes(json.dumps({
+            'seen_statuses': [['hw', 'approved', None], [1, 2, 3]]
+        }).encode())
+        assert list(homework_bot.load_state()['seen_statuses']) == [
+            ('hw', 'approved', None)
+        ], (
+            'Убедитесь, что функция `load_state` восстанавливает '
+            'корректные сохранённые обновления статусов'
+        )
+        state_file.write_text('not json')
+        assert homework_bot.load_state() == {}, (
+            'Убедитесь, что функция `load_state` возвращает пустой словарь, '
+            'если файл состояния повреждён'
+        )
+
+    def test_select_new_homeworks(self, random_timestamp):
+        from collections import OrderedDict
+
+        import homework_bot
+
+        homework = {
+            'homework_name': str(random_timestamp),
+            'status': 'approved',
+            'date_updated': '2020-02-13T14:40:57Z',
+        }
+        seen = OrderedDict()
+
+        func_name = 'select_new_homeworks'
+        assert homework_bot.select_new_homeworks([homework], seen) == [
+            homework
+        ], (
+            f'Убедитесь, что функция `{func_name}` возвращает домашние '
+            'работы, о которых бот ещё не сообщал'
+        )
+        homework_bot.remember_homeworks([homework], seen)
+        assert homework_bot.select_new_homeworks([homework], seen) == [], (
+            f'Убедитесь, что функция `{func_name}` пропускает домашние '
+            'работы, о которых бот уже сообщал'
+        )
+        assert homework_bot.select_new_homeworks(
+            [homework, homework], OrderedDict()
+        ) == [homework], (
+            f'Убедитесь, что функция `{func_name}` отбрасывает повторы '
+            'одного обновления внутри ответа API'
+        )
+
+    def test_check_response_homeworks_none(self):
+        import homework_bot
+
+        func_name = 'check_response'
+        try:
+            homework_bot.check_response({'homeworks': None, 'current_date': 1})
+        except KeyError:
+            pass
+        else:
+            assert False, (
+                f'Убедитесь, что функция `{func_name}` выбрасывает `KeyError`, '
+                "если значение ключа 'homeworks' равно None"
+            )
+
     def test_parse_status(self, random_timestamp):
         test_data = {
             "id": 123,
@@ -315,10 +818,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_response_get)
+
         func_name = 'check_response'
         response = homework_bot.get_api_answer(current_timestamp)
         status = homework_bot.check_response(response)
@@ -352,10 +855,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_response_get)
+
         func_name = 'parse_status'
         response = homework_bot.get_api_answer(current_timestamp)
         homeworks = homework_bot.check_response(response)
@@ -400,10 +903,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_response_get)
+
         func_name = 'parse_status'
         response = homework_bot.get_api_answer(current_timestamp)
         homeworks = homework_bot.check_response(response)
@@ -448,10 +951,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_response_get)
+
         func_name = 'parse_status'
         response = homework_bot.get_api_answer(current_timestamp)
         homeworks = homework_bot.check_response(response)
@@ -484,10 +987,10 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_no_homeworks_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_no_homeworks_response_get)
+
         func_name = 'check_response'
         result = homework_bot.get_api_answer(current_timestamp)
         try:
@@ -525,10 +1028,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_response_get)
+
         func_name = 'check_response'
         response = homework_bot.get_api_answer(current_timestamp)
         try:
@@ -565,10 +1068,10 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_response_get)
+
         func_name = 'check_response'
         response = homework_bot.get_api_answer(current_timestamp)
         try:
@@ -599,10 +1102,10 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_empty_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_empty_response_get)
+
         func_name = 'check_response'
         result = homework_bot.get_api_answer(current_timestamp)
         try:
@@ -626,10 +1129,10 @@ class TestHomework:
             )
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
-
         import homework_bot
 
+        monkeypatch.setattr(homework_bot.SESSION, 'get', mock_response_get)
+
         func_name = 'check_response'
         try:
             homework_bot.get_api_answer(current_timestamp)
@@ -3,57 +3,55 @@
 могут возникнуть при сбое работы пакета homework_bot.py .
 '''
 
-messages_dict = {
-    'missing_var':
-        "Отсутствуют необходимые переменные окружения.",
-    'endpoint_error':
-        ("Эндпоинт"
-        " https://practicum.yandex.ru/api/user_api/homework_statuses/111"
-        " недоступен. Код ответа API: 404"),
-    'empty_response_dict':
-        "Ответ API содержит пустой словарь.",
-    'unknown_homework_status':
-        "Недокументированный статус домашней работы.",
-}
-
 
 class MissingVariableError(Exception):
     """
     Ошибка отсутсвия переменной окружения.
     """
-    def __init__(
-        self, missing_vars, message=messages_dict['missing_var']
-    ):
+    MESSAGE = "Отсутствуют необходимые переменные окружения."
+
+    def __init__(self, missing_vars=()):
         self.missing_vars = missing_vars
-        self.message = message
-        super().__init__(self.message)
+        super().__init__(self.MESSAGE)
+
+    def __reduce__(self):
+        return self.__class__, (self.missing_vars,)
 
     def __str__(self):
-        return f"{self.message} {','.join(self.missing_vars)}"
+        if self.missing_vars:
+            return f"{self.MESSAGE} {','.join(self.missing_vars)}"
+        return self.MESSAGE
 
 
 class EndPointError(Exception):
     """
     Cбой запроса к эндпоинту API Практикум.Домашка.
     """
-    def __init__(self, message=messages_dict['endpoint_error']):
-        self.message = message
-        super().__init__(self.message)
+    MESSAGE = (
+        "Эндпоинт"
+        " https://practicum.yandex.ru/api/user_api/homework_statuses/111"
+        " недоступен. Код ответа API: 404"
+    )
+
+    def __init__(self, message=MESSAGE):
+        super().__init__(message)
 
 
 class EmptyResponseDictError(Exception):
     """
     Ошибка ответа API: ответ содержит пустой словарь.
     """
-    def __init__(self, message=messages_dict['empty_response_dict']):
-        self.message = message
-        super().__init__(self.message)
+    MESSAGE = "Ответ API содержит пустой словарь."
+
+    def __init__(self, message=MESSAGE):
+        super().__init__(message)
 
 
 class UnknownHomeworkStatusError(Exception):
     """
     Ошибка ответа API: ответ содержит неизвестный статус домашней работы.
     """
-    def __init__(self, message=messages_dict['unknown_homework_status']):
-        self.message = message
-        super().__init__(self.message)
+    MESSAGE = "Недокументированный статус домашней работы."
+
+    def __init__(self, message=MESSAGE):
+        super().__init__(message)